@@ -0,0 +1,280 @@
+"""
+Retrieval benchmark: latency vs recall across index modes and corpus sizes
+
+Generates synthetic MiniLM-sized corpora, then for every retrieval mode
+measures index build time, memory footprint, single and batched query
+latency, and recall@k against brute-force exact search. Runs offline on
+CPU only; no model or API key is needed.
+
+Usage:
+    python benchmarks/retrieval_benchmark.py
+    python benchmarks/retrieval_benchmark.py --sizes 10000,100000,1000000,10000000
+    python benchmarks/retrieval_benchmark.py --output new.json --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Allow running from the repo root or from inside benchmarks/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import (
+    EMBEDDING_DIM,
+    build_index,
+    search_index,
+    normalize_rows,
+    search_normalized_index,
+)
+from shared_index import default_shared_dir
+
+
+def build_shared_memmap(embeddings):
+    """Normalized rows in a read-only memory-mapped .npy, as served by shared_index.py"""
+    directory = default_shared_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"benchmark_{os.getpid()}.npy")
+
+    index = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=embeddings.shape)
+    normalize_rows(embeddings, out=index)
+    index.flush()
+    del index
+
+    index = np.load(path, mmap_mode='r')
+    # The mapping outlives the file on POSIX, so nothing is left in /dev/shm
+    os.remove(path)
+    return index
+
+
+# Every retrieval mode the app supports; add new modes here
+RETRIEVAL_MODES = {
+    'exact': {'build': build_index, 'search': search_index},
+    'shared_memmap': {'build': build_shared_memmap, 'search': search_normalized_index},
+}
+
+DEFAULT_SIZES = "10000,100000,1000000"
+
+# Metrics where a larger value is a regression, checked by --compare
+REGRESSION_METRICS = ['build_seconds', 'index_bytes', 'single_query_ms_p50', 'batch_query_ms_p50']
+
+
+def generate_corpus(n_chunks, dim, rng, n_clusters=256, block_size=100_000):
+    """
+    Clustered float32 embeddings, so nearest neighbours are meaningful
+
+    Generated block by block to keep peak memory close to the final matrix.
+    """
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    corpus = np.empty((n_chunks, dim), dtype=np.float32)
+    for start in range(0, n_chunks, block_size):
+        stop = min(start + block_size, n_chunks)
+        labels = rng.integers(0, n_clusters, stop - start)
+        noise = rng.standard_normal((stop - start, dim), dtype=np.float32)
+        corpus[start:stop] = centers[labels] + 0.5 * noise
+    return corpus
+
+
+def generate_queries(corpus, n_queries, rng):
+    """Perturbed copies of random corpus rows"""
+    rows = rng.integers(0, len(corpus), n_queries)
+    noise = rng.standard_normal((n_queries, corpus.shape[1]), dtype=np.float32)
+    return corpus[rows] + 0.3 * noise
+
+
+def exact_top_k(corpus, queries, top_k, block_size=200_000):
+    """Brute-force cosine ground truth, computed block by block"""
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    best_scores = np.full((len(q), top_k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(q), top_k), dtype=np.int64)
+
+    for start in range(0, len(corpus), block_size):
+        block = corpus[start:start + block_size]
+        block = block / np.linalg.norm(block, axis=1, keepdims=True)
+        scores = q @ block.T
+
+        # Merge this block's candidates with the running best
+        k = min(top_k, scores.shape[1])
+        cand = np.argpartition(scores, -k, axis=1)[:, -k:]
+        cand_scores = np.take_along_axis(scores, cand, axis=1)
+        all_scores = np.concatenate([best_scores, cand_scores], axis=1)
+        all_ids = np.concatenate([best_ids, cand + start], axis=1)
+        keep = np.argsort(all_scores, axis=1)[:, -top_k:]
+        best_scores = np.take_along_axis(all_scores, keep, axis=1)
+        best_ids = np.take_along_axis(all_ids, keep, axis=1)
+
+    return best_ids
+
+
+def recall_at_k(found, truth):
+    hits = [len(set(f) & set(t)) for f, t in zip(found, truth)]
+    return float(np.mean(hits) / truth.shape[1])
+
+
+def summarize_ms(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {
+        'mean': float(ms.mean()),
+        'p50': float(np.percentile(ms, 50)),
+        'p95': float(np.percentile(ms, 95)),
+    }
+
+
+def run_mode(mode_name, mode, corpus, queries, truth, top_k, batch_size):
+    # Build, tracking peak allocations on top of the raw corpus
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = mode['build'](corpus)
+    build_seconds = time.perf_counter() - start
+    _, build_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Warm up once so lazy imports and BLAS thread start-up are not counted
+    mode['search'](index, queries[0], top_k)
+
+    # Single queries, as issued by RAGSystem.get_response
+    single_times = []
+    single_found = []
+    tracemalloc.start()
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = mode['search'](index, query, top_k)
+        single_times.append(time.perf_counter() - start)
+        single_found.append(ids[0])
+    _, query_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Batched queries
+    batch_times = []
+    batch_found = []
+    for start_row in range(0, len(queries), batch_size):
+        batch = queries[start_row:start_row + batch_size]
+        start = time.perf_counter()
+        ids, _ = mode['search'](index, batch, top_k)
+        batch_times.append(time.perf_counter() - start)
+        batch_found.extend(ids)
+
+    single = summarize_ms(single_times)
+    batched = summarize_ms(batch_times)
+    return {
+        'mode': mode_name,
+        'n_chunks': int(corpus.shape[0]),
+        'dim': int(corpus.shape[1]),
+        'top_k': top_k,
+        'batch_size': batch_size,
+        'build_seconds': build_seconds,
+        'index_bytes': int(getattr(index, 'nbytes', 0)),
+        'build_peak_bytes': int(build_peak),
+        'query_peak_bytes': int(query_peak),
+        'single_query_ms_mean': single['mean'],
+        'single_query_ms_p50': single['p50'],
+        'single_query_ms_p95': single['p95'],
+        'batch_query_ms_mean': batched['mean'],
+        'batch_query_ms_p50': batched['p50'],
+        'batch_query_ms_p95': batched['p95'],
+        'batch_queries_per_second': len(queries) / sum(batch_times),
+        'recall_at_k': recall_at_k(single_found, truth),
+        'batch_recall_at_k': recall_at_k(batch_found, truth),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Print ratios against a previous run; returns True if anything regressed"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['mode'], r['n_chunks']): r for r in baseline['results']}
+
+    regressed = False
+    print(f"\nComparison with {baseline_path} (tolerance {tolerance:.0%})")
+    for result in results:
+        old = previous.get((result['mode'], result['n_chunks']))
+        if old is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            if not old.get(metric):
+                continue
+            ratio = result[metric] / old[metric]
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = "  <-- regression"
+                regressed = True
+            print(f"  {result['mode']:>13} n={result['n_chunks']:>9,} {metric:<22} x{ratio:.2f}{flag}")
+        if result['recall_at_k'] < old['recall_at_k'] - 1e-6:
+            print(f"  {result['mode']:>13} n={result['n_chunks']:>9,} recall_at_k dropped "
+                  f"{old['recall_at_k']:.3f} -> {result['recall_at_k']:.3f}  <-- regression")
+            regressed = True
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval path of RAGSystem")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help="Comma-separated corpus sizes (chunks)")
+    parser.add_argument('--modes', default=",".join(RETRIEVAL_MODES),
+                        help="Comma-separated retrieval modes")
+    parser.add_argument('--dim', type=int, default=EMBEDDING_DIM)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default="retrieval_benchmark.json")
+    parser.add_argument('--compare', help="Previous results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed slowdown before --compare reports a regression")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    modes = args.modes.split(",")
+    for mode_name in modes:
+        if mode_name not in RETRIEVAL_MODES:
+            parser.error(f"Unknown mode '{mode_name}'. Choose from: {', '.join(RETRIEVAL_MODES)}")
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for n_chunks in sizes:
+        print(f"Generating corpus: {n_chunks:,} x {args.dim} "
+              f"({n_chunks * args.dim * 4 / 1e9:.2f} GB)")
+        corpus = generate_corpus(n_chunks, args.dim, rng)
+        queries = generate_queries(corpus, args.queries, rng)
+        truth = exact_top_k(corpus, queries, args.top_k)
+
+        for mode_name in modes:
+            result = run_mode(mode_name, RETRIEVAL_MODES[mode_name], corpus, queries,
+                              truth, args.top_k, args.batch_size)
+            results.append(result)
+            print(f"  {mode_name:>13}: build {result['build_seconds']:.2f}s, "
+                  f"index {result['index_bytes'] / 1e6:.0f} MB, "
+                  f"single p50 {result['single_query_ms_p50']:.2f} ms, "
+                  f"batch p50 {result['batch_query_ms_p50']:.2f} ms, "
+                  f"recall@{args.top_k} {result['recall_at_k']:.3f}")
+
+        del corpus
+
+    report = {
+        'benchmark': 'retrieval',
+        'created': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Pick the relevance threshold for RAGSystem from labeled questions
+
+The labeled set is a JSONL file, one question per line:
+    {"question": "What projects have you worked on?", "answerable": true}
+    {"question": "What's the capital of Peru?", "answerable": false}
+
+For each question the best retrieval similarity is computed. The chosen
+threshold is the highest one that still forwards at least --min-recall of
+the answerable questions to the LLM; everything scoring below it gets the
+canned answer without an LLM call.
+
+Usage:
+    python calibrate_threshold.py labeled_questions.jsonl
+    python calibrate_threshold.py labeled_questions.jsonl --data support.joblib --min-recall 0.98
+
+Then set RAG_RELEVANCE_THRESHOLD (or "relevance_threshold" for a collection)
+to the printed value.
+"""
+import argparse
+import json
+import math
+
+import numpy as np
+
+
+def load_labeled_questions(path):
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if 'question' not in record or 'answerable' not in record:
+                raise ValueError(f"{path}:{line_number}: needs 'question' and 'answerable'")
+            questions.append((record['question'], bool(record['answerable'])))
+    return questions
+
+
+def choose_threshold(answerable_scores, unanswerable_scores, min_recall=0.95):
+    """
+    Highest threshold that forwards at least min_recall of answerable questions
+
+    Questions are gated when their best score is strictly below the threshold.
+
+    Returns:
+        dict: threshold plus the recall and gate rate it achieves on the labeled set
+    """
+    if not 0 <= min_recall <= 1:
+        raise ValueError(f"min_recall must be between 0 and 1, got {min_recall}")
+
+    answerable = np.sort(np.asarray(answerable_scores, dtype=float))
+    unanswerable = np.asarray(unanswerable_scores, dtype=float)
+    if len(answerable) == 0:
+        raise ValueError("Need at least one answerable question to calibrate")
+
+    # Number of answerable questions we may gate and still meet min_recall;
+    # the best-scoring one always stays, so the threshold is one of the scores
+    allowed_misses = int(math.floor((1 - min_recall) * len(answerable) + 1e-9))
+    allowed_misses = min(allowed_misses, len(answerable) - 1)
+    threshold = float(answerable[allowed_misses])
+
+    recall = float(np.mean(answerable >= threshold))
+    gated_unanswerable = float(np.mean(unanswerable < threshold)) if len(unanswerable) else None
+    return {
+        'threshold': threshold,
+        'answerable_recall': recall,
+        'unanswerable_gated': gated_unanswerable,
+        'answerable_count': int(len(answerable)),
+        'unanswerable_count': int(len(unanswerable)),
+        'min_recall': min_recall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the RAG relevance threshold")
+    parser.add_argument('labeled', help="JSONL file of {question, answerable}")
+    parser.add_argument('--data', default=None,
+                        help="Index to calibrate against (default: the app's index)")
+    parser.add_argument('--min-recall', type=float, default=0.95,
+                        help="Fraction of answerable questions that must still reach the LLM")
+    parser.add_argument('--output', help="Write the result as JSON to this file")
+    args = parser.parse_args()
+    if not 0 <= args.min_recall <= 1:
+        parser.error("--min-recall must be between 0 and 1")
+
+    # Imported here so --help works without loading the model
+    from rag_system import RAGSystem, rag_system
+
+    system = rag_system
+    if args.data is not None:
+        system = RAGSystem(data_path=args.data, model=rag_system.model)
+
+    questions = load_labeled_questions(args.labeled)
+    answerable_scores = []
+    unanswerable_scores = []
+    for question, answerable in questions:
+        chunks, scores = system.retrieve(question)
+        if chunks is None:
+            parser.error("Index not loaded. Please check data files.")
+        (answerable_scores if answerable else unanswerable_scores).append(float(scores[0]))
+
+    result = choose_threshold(answerable_scores, unanswerable_scores, args.min_recall)
+
+    print(f"Questions: {result['answerable_count']} answerable, "
+          f"{result['unanswerable_count']} unanswerable")
+    print(f"Answerable best score:   min {min(answerable_scores):.3f}, "
+          f"median {np.median(answerable_scores):.3f}")
+    if unanswerable_scores:
+        print(f"Unanswerable best score: max {max(unanswerable_scores):.3f}, "
+              f"median {np.median(unanswerable_scores):.3f}")
+    print(f"\nThreshold: {result['threshold']:.4f}")
+    print(f"  answerable forwarded to LLM: {result['answerable_recall']:.1%}")
+    if result['unanswerable_gated'] is not None:
+        print(f"  unanswerable answered without LLM: {result['unanswerable_gated']:.1%}")
+    print(f"\nexport RAG_RELEVANCE_THRESHOLD={result['threshold']:.4f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, InvalidStateError, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# Model loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name):
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode(sentences, encode_kwargs):
+    return _worker_model.encode(sentences, **encode_kwargs)
+
+
+class EncoderQueueFull(Exception):
+    """Raised when too many encode requests are already pending"""
+
+
+class EncoderTimeout(Exception):
+    """Raised when an encode request takes longer than result_timeout"""
+
+
+class EncoderPool:
+    """
+    Runs SentenceTransformer.encode in a pool of worker processes
+
+    Keeps CPU-bound encoding off the Streamlit script threads. Each worker
+    loads the model once. At most max_pending requests are in flight;
+    further submits block (or raise EncoderQueueFull) until a slot frees up.
+    If a worker dies, the pool is restarted and the request retried once.
+    A request with no result after result_timeout counts as a hung worker:
+    the pool is killed and restarted, and the request fails.
+
+    Drop-in for the model in RAGSystem, since encode() has the same shape:
+
+        pool = EncoderPool(num_workers=2)
+        rag = RAGSystem(model=pool)
+
+    Example:
+        with EncoderPool(num_workers=2) as pool:
+            vector = pool.encode("What is gradient descent?")
+            future = pool.submit(["one", "two"])
+            vectors = future.result()
+    """
+
+    def __init__(self, model_name='all-MiniLM-L6-v2', num_workers=2, max_pending=32,
+                 queue_timeout=10.0, result_timeout=30.0, max_retries=1):
+        self.model_name = model_name
+        self.num_workers = num_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        # Bound on waiting for a worker, so a hung worker cannot block a caller forever
+        self.result_timeout = result_timeout
+        self.max_retries = max_retries
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'restarts': 0,
+        }
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        # Caller-facing future -> executor running it, until _finish
+        self._inflight = {}
+        self._closed = False
+        self._executor = self._start_executor()
+
+    def _start_executor(self):
+        # spawn, not fork: torch does not survive forking a threaded parent
+        return ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_name,),
+        )
+
+    def submit(self, sentences, block=True, timeout=None, **encode_kwargs):
+        """
+        Queue sentences for encoding
+
+        Args:
+            sentences: A string or list of strings
+            block: Wait for a free slot when the queue is full (default True)
+            timeout: Max seconds to wait for a slot when blocking
+            **encode_kwargs: Passed through to SentenceTransformer.encode
+
+        Returns:
+            concurrent.futures.Future resolving to the embeddings
+
+        Raises:
+            EncoderQueueFull: No slot became free in time
+        """
+        if self._closed:
+            raise RuntimeError("EncoderPool is shut down")
+
+        acquired = self._slots.acquire(timeout=timeout) if block else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise EncoderQueueFull(f"{self.max_pending} encode requests already pending")
+
+        with self._lock:
+            self.stats['submitted'] += 1
+
+        # Caller-facing future; stays the same across worker restarts.
+        # The slot is released in _finish, once the worker is really done,
+        # so cancelling this future does not let more work in.
+        result = Future()
+        with self._lock:
+            self._inflight[result] = None
+        self._dispatch(result, sentences, encode_kwargs, attempt=0)
+        return result
+
+    def encode(self, sentences, **encode_kwargs):
+        """Blocking encode with the same call shape as SentenceTransformer.encode"""
+        future = self.submit(sentences, timeout=self.queue_timeout, **encode_kwargs)
+        try:
+            return future.result(timeout=self.result_timeout)
+        except TimeoutError:
+            self._expire(future)
+            raise EncoderTimeout(f"No embedding after {self.result_timeout}s")
+
+    async def encode_async(self, sentences, **encode_kwargs):
+        """Awaitable encode; waiting for a queue slot does not block the event loop"""
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(
+            None, lambda: self.submit(sentences, timeout=self.queue_timeout, **encode_kwargs)
+        )
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.result_timeout)
+        except asyncio.TimeoutError:
+            self._expire(future)
+            raise EncoderTimeout(f"No embedding after {self.result_timeout}s")
+
+    def _dispatch(self, result, sentences, encode_kwargs, attempt):
+        with self._lock:
+            executor = self._executor
+            if result in self._inflight:
+                self._inflight[result] = executor
+
+        try:
+            inner = executor.submit(_encode, sentences, encode_kwargs)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._handle_failure(result, executor, sentences, encode_kwargs, attempt, e)
+            return
+
+        inner.add_done_callback(
+            lambda f: self._on_done(f, result, executor, sentences, encode_kwargs, attempt)
+        )
+
+    def _on_done(self, inner, result, executor, sentences, encode_kwargs, attempt):
+        with self._lock:
+            if result not in self._inflight:
+                # Already failed by _expire; the pool it ran on was killed
+                return
+        error = inner.exception()
+        if isinstance(error, BrokenProcessPool):
+            self._handle_failure(result, executor, sentences, encode_kwargs, attempt, error)
+        elif error is not None:
+            self._finish(result, error=error)
+        else:
+            self._finish(result, value=inner.result())
+
+    def _handle_failure(self, result, executor, sentences, encode_kwargs, attempt, error):
+        if self._closed:
+            self._finish(result, error=error)
+            return
+
+        print(f"Encoder worker crashed ({error}); restarting pool")
+        self._restart(executor)
+        if attempt >= self.max_retries:
+            self._finish(result, error=error)
+        else:
+            self._dispatch(result, sentences, encode_kwargs, attempt + 1)
+
+    def _expire(self, result):
+        # A result timeout is treated like a crash, except the request is not retried
+        with self._lock:
+            executor = self._inflight.get(result)
+        if executor is None:
+            return
+
+        self._finish(result, error=EncoderTimeout(f"No embedding after {self.result_timeout}s"))
+        if self._closed:
+            return
+
+        print(f"Encoder worker hung for {self.result_timeout}s; restarting pool")
+        self._terminate(executor)
+        self._restart(executor)
+
+    @staticmethod
+    def _terminate(executor):
+        # shutdown() waits for running tasks, so a hung worker has to be killed;
+        # requests still on this executor then fail with BrokenProcessPool and are retried
+        terminate_workers = getattr(executor, 'terminate_workers', None)  # Python 3.14+
+        if terminate_workers is not None:
+            terminate_workers()
+            return
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+
+    def _restart(self, broken):
+        with self._lock:
+            # Several requests see the same crash; only the first restarts
+            if self._executor is not broken or self._closed:
+                return
+            broken.shutdown(wait=False)
+            self._executor = self._start_executor()
+            self.stats['restarts'] += 1
+
+    def _finish(self, result, value=None, error=None):
+        with self._lock:
+            # Runs once per request, so the slot is released exactly once
+            if self._inflight.pop(result, False) is False:
+                return
+            self.stats['failed' if error is not None else 'completed'] += 1
+        self._slots.release()
+        try:
+            if error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(value)
+        except InvalidStateError:
+            # Caller cancelled while the worker was busy
+            pass
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._closed = True
+            executor = self._executor
+        executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
@@ -2,11 +2,16 @@ import requests
 import os
 from dotenv import load_dotenv
 import time
+import argparse
+import json
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 # Load environment variables
 load_dotenv()
 
-def transcribe_audio_with_groq(audio_bytes, api_key=None, language="en"):
+def transcribe_audio_with_groq(audio_bytes, api_key=None, language="en", filename="audio.wav"):
     """
     Transcribe audio using Groq's Whisper API
     
@@ -14,6 +19,7 @@ def transcribe_audio_with_groq(audio_bytes, api_key=None, language="en"):
         audio_bytes: Audio data as bytes
         api_key: Groq API key (optional, will use GROQ_API_KEY env var)
         language: Language code (default: "en" for English)
+        filename: Name sent with the upload; its extension tells the API the format
     
     Returns:
         tuple: (transcribed_text, error_message)
@@ -48,7 +54,7 @@ def transcribe_audio_with_groq(audio_bytes, api_key=None, language="en"):
     
     # Prepare the request
     files = {
-        'file': ('audio.wav', audio_bytes, 'audio/wav')
+        'file': (filename, audio_bytes, mimetypes.guess_type(filename)[0] or 'audio/wav')
     }
     data = {
         'model': 'whisper-large-v3',
@@ -147,35 +153,211 @@ def get_groq_llm_response(prompt, api_key=None, model="mixtral-8x7b-32768"):
         return None, f"Error: {str(e)}"
 
 
-# Simple usage example
-if __name__ == "__main__":
-    # Test with a file
-    test_file = "test_audio.wav"  # Replace with your audio file
+# Formats accepted by the Groq transcription endpoint
+AUDIO_EXTENSIONS = {'.flac', '.mp3', '.mp4', '.mpeg', '.mpga', '.m4a', '.ogg', '.opus', '.wav', '.webm'}
+
+# Errors worth retrying: rate limits, server errors, network trouble
+RETRYABLE_ERRORS = ("API Error 429", "API Error 5", "Request timeout", "Connection error")
+
+
+def find_audio_files(source):
+    """
+    List audio files to transcribe
     
-    if os.path.exists(test_file):
-        print("Testing Groq transcription...")
-        
-        # Read audio file
-        with open(test_file, "rb") as f:
+    Args:
+        source: A directory (searched recursively), a text manifest with one path
+            per line, or a JSONL manifest with a "path" field per line.
+            Relative manifest paths are resolved against the manifest's folder.
+    
+    Returns:
+        list: Absolute file paths, in a stable order
+    """
+    if os.path.isdir(source):
+        files = []
+        for root, _, names in os.walk(source):
+            for name in names:
+                if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                    files.append(os.path.abspath(os.path.join(root, name)))
+        return sorted(files)
+    
+    base_dir = os.path.dirname(os.path.abspath(source))
+    files = []
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path = json.loads(line)['path'] if line.startswith('{') else line
+            files.append(os.path.abspath(os.path.join(base_dir, path)))
+    return files
+
+
+def load_completed(output_path):
+    """Paths already transcribed successfully in a previous run"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Partial last line from an interrupted run
+                continue
+            if record.get('status') == 'ok':
+                completed.add(record['path'])
+    return completed
+
+
+def transcribe_file(path, api_key=None, language="en", answer_fn=None, retries=2):
+    """
+    Transcribe one file (and optionally answer it), retrying transient errors
+    
+    Args:
+        answer_fn: Optional callable(text) -> (answer, error), like
+            RAGSystem.get_response_with_error; an error fails the record
+    
+    Returns:
+        dict: One JSONL record with path, status, text, error and timing
+    """
+    start = time.time()
+    record = {'path': path, 'status': 'error', 'text': None, 'error': None}
+    
+    try:
+        with open(path, 'rb') as f:
             audio_data = f.read()
+    except OSError as e:
+        record['error'] = f"Read error: {str(e)}"
+        record['seconds'] = round(time.time() - start, 3)
+        return record
+    
+    for attempt in range(retries + 1):
+        text, error = transcribe_audio_with_groq(
+            audio_data, api_key, language, filename=os.path.basename(path)
+        )
+        if text or not error.startswith(RETRYABLE_ERRORS) or attempt == retries:
+            break
+        # Exponential backoff before retrying
+        time.sleep(2 ** attempt)
+    
+    record['text'] = text
+    record['error'] = error
+    record['attempts'] = attempt + 1
+    if text:
+        record['status'] = 'ok'
+        if answer_fn is not None:
+            try:
+                answer, answer_error = answer_fn(text)
+            except Exception as e:
+                answer, answer_error = None, str(e)
+            record['answer'] = answer
+            if answer_error:
+                # Not 'ok', so a resumed run answers this file again
+                record['status'] = 'error'
+                record['error'] = f"RAG error: {answer_error}"
+    
+    record['seconds'] = round(time.time() - start, 3)
+    return record
+
+
+def batch_transcribe(files, output_path, workers=4, api_key=None, language="en",
+                     answer_fn=None, retries=2):
+    """
+    Transcribe many files with a bounded pool of worker threads
+    
+    Each result is appended to output_path as a JSONL line as soon as it is
+    ready, so an interrupted run can resume where it stopped.
+    
+    Returns:
+        dict: Summary with counts, files/sec and error rate
+    """
+    write_lock = threading.Lock()
+    stats = {'ok': 0, 'error': 0}
+    start = time.time()
+    
+    with open(output_path, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
         
-        # Transcribe
-        text, error = transcribe_audio_with_groq(audio_data)
+        def handle(future):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                stats[record['status']] += 1
+                done = stats['ok'] + stats['error']
+                rate = done / max(time.time() - start, 1e-9)
+                mark = "✅" if record['status'] == 'ok' else "❌"
+                print(f"{mark} [{done}/{len(files)}] {os.path.basename(record['path'])} "
+                      f"({rate:.2f} files/sec){'' if record['status'] == 'ok' else ' - ' + record['error']}")
         
-        if text:
-            print(f"✅ Transcription: {text}")
-            
-            
-            # Get LLM response
-            print("\nGetting AI response...")
-            response, error = get_groq_llm_response(text)
-            
-            if response:
-                print(f"🤖 Response: {response}")
-            else:
-                print(f"❌ LLM Error: {error}")
-        else:
-            print(f"❌ Transcription Error: {error}")
+        # Keep at most 2x workers files queued, so huge folders are not all submitted at once
+        for path in files:
+            pending.add(pool.submit(transcribe_file, path, api_key, language, answer_fn, retries))
+            if len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    handle(future)
+        
+        for future in as_completed(pending):
+            handle(future)
+    
+    elapsed = time.time() - start
+    processed = stats['ok'] + stats['error']
+    return {
+        'processed': processed,
+        'ok': stats['ok'],
+        'errors': stats['error'],
+        'seconds': round(elapsed, 2),
+        'files_per_sec': round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+        'error_rate': round(stats['error'] / processed, 4) if processed else 0.0,
+    }
+
+
+# Batch transcription command
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Transcribe a folder or manifest of audio files with Groq Whisper"
+    )
+    parser.add_argument('source', help="Audio folder, or manifest (one path per line, or JSONL with \"path\")")
+    parser.add_argument('-o', '--output', default="transcripts.jsonl", help="JSONL results file")
+    parser.add_argument('-w', '--workers', type=int, default=4, help="Concurrent requests")
+    parser.add_argument('--language', default="en")
+    parser.add_argument('--retries', type=int, default=2, help="Retries for rate limits and network errors")
+    parser.add_argument('--rag', action='store_true', help="Also answer each transcript with RAGSystem.get_response_with_error")
+    parser.add_argument('--no-resume', action='store_true', help="Redo files already in the output")
+    args = parser.parse_args()
+    
+    if not os.getenv("GROQ_API_KEY"):
+        parser.error("Set GROQ_API_KEY environment variable.")
+    if not os.path.exists(args.source):
+        parser.error(f"'{args.source}' not found")
+    
+    files = find_audio_files(args.source)
+    if not args.no_resume:
+        completed = load_completed(args.output)
+        skipped = len(files)
+        files = [f for f in files if f not in completed]
+        skipped -= len(files)
+        if skipped:
+            print(f"Resuming: skipping {skipped} file(s) already in '{args.output}'")
+    
+    if not files:
+        print("Nothing to transcribe.")
     else:
-        print(f"Test file '{test_file}' not found.")
-        print("Create a test WAV file or use the function in your code.")
\ No newline at end of file
+        answer_fn = None
+        if args.rag:
+            # Loads the embedding model and index, so only when asked for
+            from rag_system import rag_system
+            # Workers answer concurrently, so don't let them all overwrite prompt.txt
+            answer_fn = lambda text: rag_system.get_response_with_error(text, save_prompt=False)
+        
+        print(f"Transcribing {len(files)} file(s) with {args.workers} worker(s)...")
+        summary = batch_transcribe(
+            files, args.output, workers=args.workers, language=args.language,
+            answer_fn=answer_fn, retries=args.retries
+        )
+        
+        print(f"\nDone: {summary['ok']} ok, {summary['errors']} failed in {summary['seconds']}s")
+        print(f"Throughput: {summary['files_per_sec']} files/sec")
+        print(f"Error rate: {summary['error_rate']:.1%}")
@@ -4,9 +4,21 @@ import os
 from gtts import gTTS
 import io
 from rag_system import rag_system
+from rag_collections import CollectionManager
 import json
 import random
+import queue
+import time
 from datetime import datetime
+import streamlit.components.v1 as components
+from voice_stream import HandsFreeListener
+
+# Optional: continuous hands-free mode streams audio over WebRTC
+try:
+    from streamlit_webrtc import webrtc_streamer, WebRtcMode
+    WEBRTC_AVAILABLE = True
+except ImportError:
+    WEBRTC_AVAILABLE = False
 
 # Page Config
 st.set_page_config(
@@ -18,6 +30,20 @@ st.set_page_config(
 # Get API key
 api_key = os.getenv("GROQ_API_KEY")
 
+# Optional named collections (one knowledge base per persona/tenant)
+COLLECTIONS_CONFIG = os.getenv("RAG_COLLECTIONS_CONFIG", "collections.json")
+
+
+@st.cache_resource
+def get_collection_manager():
+    """Process-wide collection manager, shared by every session."""
+    if not os.path.exists(COLLECTIONS_CONFIG):
+        return None
+    return CollectionManager.from_json(COLLECTIONS_CONFIG, model=rag_system.model)
+
+
+collection_manager = get_collection_manager()
+
 # Initialize session states
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
@@ -301,6 +327,35 @@ with st.sidebar:
     
     st.divider()
     
+    # Conversation mode
+    st.subheader("🎧 Conversation Mode")
+    st.toggle(
+        "Hands-free mode",
+        key='hands_free',
+        disabled=not WEBRTC_AVAILABLE,
+        help="Talk continuously; each pause sends your question and speaking interrupts the answer."
+    )
+    if not WEBRTC_AVAILABLE:
+        st.caption("Install streamlit-webrtc to enable hands-free mode.")
+    
+    # Knowledge base selector
+    if collection_manager is not None:
+        st.divider()
+        st.subheader("📚 Knowledge Base")
+        st.selectbox(
+            "Choose collection",
+            options=collection_manager.names(),
+            key='collection_name'
+        )
+        collection_stats = collection_manager.stats()
+        st.caption(
+            f"Resident: {', '.join(collection_stats['resident']) or 'none'} "
+            f"({collection_stats['resident_bytes'] / 1e6:.1f} MB) · "
+            f"Loads: {collection_stats['loads']} · Evictions: {collection_stats['evictions']}"
+        )
+    
+    st.divider()
+    
     # Session Feedback
     st.subheader("📊 Session Stats")
     col1, col2 = st.columns(2)
@@ -312,6 +367,11 @@ with st.sidebar:
     if st.session_state.session_feedback['last_interaction']:
         st.caption(f"Last interaction: {st.session_state.session_feedback['last_interaction'].strftime('%H:%M:%S')}")
     
+    # Relevance gate counters (whole process, not just this session)
+    gate_stats = collection_manager.stats() if collection_manager is not None else rag_system.gate_stats
+    if gate_stats['gated'] or gate_stats['forwarded']:
+        st.caption(f"Answered without LLM: {gate_stats['gated']} · Sent to LLM: {gate_stats['forwarded']}")
+    
     # Chat History Summary
     if st.session_state.chat_history:
         st.divider()
@@ -349,12 +409,9 @@ viz_html = create_visualization(volume_level=30, is_recording=False)
 viz_placeholder.html(viz_html)
 
 
-# Record audio section
-# st.subheader("🎤 Voice Input")
-audio_bytes = st.audio_input("Click to record your question", key="audio_input")
-
-# Process audio if recorded
-if audio_bytes:
+# Process one spoken question: transcribe, answer, speak
+def process_voice_turn(audio_bytes):
+    """Transcribes a recorded question, answers it from the RAG system and speaks the answer."""
     # Update visualization to show recording state - FAST
     recording_html = create_visualization(volume_level=60, is_recording=True)
     viz_placeholder.html(recording_html)
@@ -404,7 +461,10 @@ if audio_bytes:
             # Get response from RAG system - FAST
             with st.spinner("🤔 Thinking..."):
                 # Remove any delays and get response immediately
-                response = rag_system.get_response(enhanced_query)
+                if collection_manager is not None:
+                    response = collection_manager.get_response(st.session_state.collection_name, enhanced_query, question=text)
+                else:
+                    response = rag_system.get_response(enhanced_query, question=text)
                 # response = "This is a fast sample response from the AI assistant."
                 play_speech(response)
             
@@ -449,28 +509,124 @@ if audio_bytes:
             """
             viz_placeholder.html(error_html)
 
-# Display chat history in main area
-if st.session_state.chat_history:
+
+def render_chat_history():
+    """Display chat history in main area"""
+    if st.session_state.chat_history:
+        st.divider()
+        st.subheader("💬 Chat History")
+    
+        chat_container = st.container()
+        with chat_container:
+            for chat in st.session_state.chat_history:
+                if chat['type'] == 'user':
+                    st.html(f"""
+                    <div class="chat-message user-message">
+                        <strong>👤 You:</strong> {chat['question']}<br>
+                        <small><em>{chat['timestamp'].strftime('%H:%M:%S')}</em></small>
+                    </div>
+                    """)
+                elif chat['type'] == 'assistant':
+                    st.html(f"""
+                    <div class="chat-message assistant-message">
+                        <strong>🤖 Assistant:</strong> {chat.get('answer', '')}<br>
+                        <small><em>{chat['timestamp'].strftime('%H:%M:%S')}</em></small>
+                    </div>
+                    """)
+
+
+def render_footer():
+    """Add footer with session info"""
     st.divider()
-    st.subheader("💬 Chat History")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.caption(f"Session started: {st.session_state.session_feedback['start_time'].strftime('%H:%M:%S')}")
+    with col2:
+        duration = datetime.now() - st.session_state.session_feedback['start_time']
+        minutes = int(duration.total_seconds() / 60)
+        st.caption(f"Session duration: {minutes} minutes")
+    with col3:
+        if st.session_state.chat_history:
+            last_chat = st.session_state.chat_history[-1]
+            if last_chat['type'] == 'user':
+                last_text = last_chat.get('question', 'Question')[:20]
+            else:
+                last_text = last_chat.get('answer', 'Response')[:20]
+        
+            if len(last_text) > 20:
+                last_text += "..."
+        
+            st.caption(f"Last: {last_text}")
+
+
+def run_hands_free():
+    """Continuous conversation: stream the microphone and answer each utterance as it ends."""
+    # One listener per session; it keeps the endpointer state across reruns
+    if 'hands_free_listener' not in st.session_state:
+        st.session_state.hands_free_listener = HandsFreeListener()
+    listener = st.session_state.hands_free_listener
     
-    chat_container = st.container()
-    with chat_container:
-        for chat in st.session_state.chat_history:
-            if chat['type'] == 'user':
-                st.html(f"""
-                <div class="chat-message user-message">
-                    <strong>👤 You:</strong> {chat['question']}<br>
-                    <small><em>{chat['timestamp'].strftime('%H:%M:%S')}</em></small>
-                </div>
-                """)
-            elif chat['type'] == 'assistant':
-                st.html(f"""
-                <div class="chat-message assistant-message">
-                    <strong>🤖 Assistant:</strong> {chat.get('answer', '')}<br>
-                    <small><em>{chat['timestamp'].strftime('%H:%M:%S')}</em></small>
-                </div>
-                """)
+    ctx = webrtc_streamer(
+        key="hands-free",
+        mode=WebRtcMode.SENDONLY,
+        audio_frame_callback=listener.on_frame,
+        # Echo cancellation keeps the assistant's own voice from triggering barge-in
+        media_stream_constraints={"audio": {"echoCancellation": True, "noiseSuppression": True}, "video": False},
+    )
+    
+    status = st.empty()
+    barge_in = st.empty()
+    live_turns = st.container()
+    
+    # The loop below only ends when the stream stops, so render the rest of the page first
+    render_chat_history()
+    render_footer()
+    
+    if not ctx.state.playing:
+        status.caption("Press START and just talk. I answer whenever you pause.")
+        return
+    
+    # Poll endpointer events until the stream stops; st calls let reruns interrupt us
+    while ctx.state.playing:
+        status.caption("🗣️ Hearing you..." if listener.endpointer.speaking else "🎧 Listening...")
+        try:
+            event, payload = listener.events.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        
+        if event == 'speech_start':
+            # Barge-in: stop any answer that is still playing
+            with barge_in:
+                components.html(f"""
+                <script>
+                // {time.time()}
+                window.parent.document.querySelectorAll('audio').forEach(a => {{ a.pause(); a.currentTime = 0; }});
+                </script>
+                """, height=0)
+        elif event == 'utterance':
+            with live_turns:
+                process_voice_turn(payload)
+            # Speech that ended while we were thinking must not pause the answer just started;
+            # an utterance still in progress keeps its speech_start and barges in as usual
+            listener.clear_events()
+
+
+# Record audio section
+hands_free = st.session_state.get('hands_free', False) and WEBRTC_AVAILABLE
+if hands_free:
+    run_hands_free()
+else:
+    # st.subheader("🎤 Voice Input")
+    audio_bytes = st.audio_input("Click to record your question", key="audio_input")
+    
+    # Process audio if recorded
+    if audio_bytes:
+        process_voice_turn(audio_bytes)
+
+
+# Display chat history in main area; hands-free mode renders it before its listening loop
+if not hands_free:
+    render_chat_history()
 
 # Fast JavaScript for real-time updates
 st.html("""
@@ -499,23 +655,5 @@ if (window.location.hash === '#recording') {
 """)
 
 # Add footer with session info
-st.divider()
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.caption(f"Session started: {st.session_state.session_feedback['start_time'].strftime('%H:%M:%S')}")
-with col2:
-    duration = datetime.now() - st.session_state.session_feedback['start_time']
-    minutes = int(duration.total_seconds() / 60)
-    st.caption(f"Session duration: {minutes} minutes")
-with col3:
-    if st.session_state.chat_history:
-        last_chat = st.session_state.chat_history[-1]
-        if last_chat['type'] == 'user':
-            last_text = last_chat.get('question', 'Question')[:20]
-        else:
-            last_text = last_chat.get('answer', 'Response')[:20]
-        
-        if len(last_text) > 20:
-            last_text += "..."
-        
-        st.caption(f"Last: {last_text}")
\ No newline at end of file
+if not hands_free:
+    render_footer()
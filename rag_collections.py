@@ -0,0 +1,216 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from rag_system import (
+    RAGSystem,
+    create_encoder,
+    DEFAULT_PROMPT_TEMPLATE,
+    DEFAULT_SYSTEM_PROMPT,
+    NO_CONTEXT_ANSWER,
+)
+from shared_index import SharedIndexReader
+
+
+class CollectionConfig:
+    """Settings for one named knowledge base"""
+
+    def __init__(self, name, data_path=None, prompt_template=DEFAULT_PROMPT_TEMPLATE,
+                 system_prompt=DEFAULT_SYSTEM_PROMPT, top_k=3, pinned=False, shared_manifest=None,
+                 relevance_threshold=None, no_context_answer=NO_CONTEXT_ANSWER):
+        if data_path is None and shared_manifest is None:
+            raise ValueError(f"Collection '{name}' needs a data_path or a shared_manifest")
+        self.name = name
+        self.data_path = data_path
+        self.prompt_template = prompt_template
+        self.system_prompt = system_prompt
+        self.top_k = top_k
+        # Pinned collections stay resident and are never evicted
+        self.pinned = pinned
+        # Serve from a shared_index.py loader instead of loading data_path
+        self.shared_manifest = shared_manifest
+        # Best-similarity cutoff below which the LLM is skipped
+        self.relevance_threshold = relevance_threshold
+        # Reply when gated; set it to match this collection's prompt and voice
+        self.no_context_answer = no_context_answer
+
+
+class CollectionManager:
+    """
+    Hosts several named RAG collections in one process.
+
+    Collections are loaded on first use and kept in LRU order. When the
+    resident indexes exceed memory_budget_mb, the least recently used
+    unpinned collections are evicted. All collections share one encoder.
+
+    Example:
+        manager = CollectionManager.from_json("collections.json")
+        answer = manager.get_response("raman", "What projects have you done?")
+    """
+
+    def __init__(self, memory_budget_mb=None, model=None):
+        self.memory_budget_bytes = None if memory_budget_mb is None else int(memory_budget_mb * 1024 * 1024)
+        self.model = model
+        self.configs = {}
+        self.resident = OrderedDict()  # name -> RAGSystem, oldest first
+        self.sizes = {}  # name -> bytes
+        self.loading = {}  # name -> Future of the RAGSystem being loaded
+        self.metrics = {
+            'loads': 0,
+            'evictions': 0,
+            'hits': 0,
+            'misses': 0,
+            'load_seconds': 0.0,
+            # Gate counters of collections already evicted
+            'gated': 0,
+            'forwarded': 0,
+        }
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_json(cls, path, model=None):
+        """
+        Build a manager from a JSON file like:
+
+            {
+                "memory_budget_mb": 512,
+                "collections": {
+                    "raman": {"data_path": "normalize_data.joblib", "pinned": true},
+                    "support": {"data_path": "support.joblib", "top_k": 5,
+                                "prompt_template": "...{retrieved_context}...{user_query}..."},
+                    "docs": {"shared_manifest": "shared_index.json"}
+                }
+            }
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        manager = cls(memory_budget_mb=config.get('memory_budget_mb'), model=model)
+        for name, settings in config.get('collections', {}).items():
+            manager.register(name, **settings)
+        return manager
+
+    def register(self, name, data_path=None, **settings):
+        """Add a collection; nothing is loaded until it is first queried"""
+        config = CollectionConfig(name, data_path, **settings)
+        with self._lock:
+            self.configs[name] = config
+            # Re-registering drops any stale resident copy
+            if name in self.resident:
+                self._evict(name)
+
+    def names(self):
+        return list(self.configs.keys())
+
+    def get(self, name):
+        """Return the RAGSystem for a collection, loading it if needed"""
+        with self._lock:
+            if name not in self.configs:
+                raise KeyError(f"Unknown collection: '{name}'")
+
+            if name in self.resident:
+                self.metrics['hits'] += 1
+                self.resident.move_to_end(name)
+                return self.resident[name]
+
+            # Someone else is already loading it; wait for their result
+            pending = self.loading.get(name)
+            if pending is None:
+                self.metrics['misses'] += 1
+                config = self.configs[name]
+                # Share a single encoder across every collection
+                if self.model is None:
+                    self.model = create_encoder()
+                pending = self.loading[name] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        # Load outside the lock so sessions on resident collections are not blocked
+        try:
+            system = self._load(config)
+        except Exception as e:
+            with self._lock:
+                self.loading.pop(name, None)
+            pending.set_exception(e)
+            raise
+
+        with self._lock:
+            self.loading.pop(name, None)
+            # register() may have replaced the config while we were loading
+            if self.configs.get(name) is config:
+                self.resident[name] = system
+                self.sizes[name] = system.memory_bytes()
+                self._enforce_budget(keep=name)
+        pending.set_result(system)
+        return system
+
+    def get_response(self, name, user_query, question=None):
+        return self.get(name).get_response(user_query, question=question)
+
+    def evict(self, name):
+        """Drop a collection from memory; it reloads on next use"""
+        with self._lock:
+            if name in self.resident:
+                self._evict(name)
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(self.sizes.values())
+
+    def stats(self):
+        """Snapshot of load/evict/gate counters and current residency"""
+        with self._lock:
+            stats = dict(self.metrics)
+            for system in self.resident.values():
+                stats['gated'] += system.gate_stats['gated']
+                stats['forwarded'] += system.gate_stats['forwarded']
+            return {
+                **stats,
+                'resident': list(self.resident.keys()),
+                'resident_bytes': sum(self.sizes.values()),
+                'memory_budget_bytes': self.memory_budget_bytes,
+            }
+
+    def _load(self, config):
+        start = time.perf_counter()
+        system = RAGSystem(
+            data_path=config.data_path,
+            model=self.model,
+            prompt_template=config.prompt_template,
+            system_prompt=config.system_prompt,
+            top_k=config.top_k,
+            shared_index=SharedIndexReader(config.shared_manifest) if config.shared_manifest else None,
+            relevance_threshold=config.relevance_threshold,
+            no_context_answer=config.no_context_answer,
+        )
+        with self._lock:
+            self.metrics['loads'] += 1
+            self.metrics['load_seconds'] += time.perf_counter() - start
+        print(f"Collection '{config.name}' loaded ({system.memory_bytes() / 1e6:.1f} MB)")
+        return system
+
+    def _evict(self, name):
+        system = self.resident.pop(name)
+        self.metrics['gated'] += system.gate_stats['gated']
+        self.metrics['forwarded'] += system.gate_stats['forwarded']
+        self.sizes.pop(name, None)
+        self.metrics['evictions'] += 1
+        print(f"Collection '{name}' evicted")
+
+    def _enforce_budget(self, keep):
+        if self.memory_budget_bytes is None:
+            return
+
+        # Walk from least recently used, skipping pinned and the one just loaded
+        for name in list(self.resident.keys()):
+            if sum(self.sizes.values()) <= self.memory_budget_bytes:
+                break
+            if name == keep or self.configs[name].pinned:
+                continue
+            self._evict(name)
@@ -1,30 +1,132 @@
 import os
+import threading
 import pandas as pd
-import numpy as np
 import joblib
 from sentence_transformers import SentenceTransformer
-from sklearn.preprocessing import normalize
-from sklearn.metrics.pairwise import cosine_similarity
 from groq import Groq
 from dotenv import load_dotenv
+from retrieval import build_index, search_index, search_normalized_index
+from encoder_pool import EncoderPool, EncoderQueueFull, EncoderTimeout
+from shared_index import SharedIndexReader
 
 load_dotenv()
 
+DEFAULT_DATA_PATH = 'normalize_data.joblib'
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant that answers questions about Data Science based on provided context."
+
+# Default canned reply when retrieval finds nothing relevant; matches the persona prompt's fallback
+NO_CONTEXT_ANSWER = "I don't have enough information to answer this based on what I know."
+
+# Replies shown to the user when no answer could be produced
+ERROR_ANSWER = "Sorry, I encountered an error while processing your request."
+BUSY_ANSWER = "I'm handling a lot of questions right now. Please try again in a moment."
+NOT_READY_ANSWER = "System not properly initialized. Please check data files."
+
+# Persona prompt; {retrieved_context} and {user_query} are filled in per question
+DEFAULT_PROMPT_TEMPLATE = """
+        [Role]
+        You are responding as Raman — the user. Use first-person ("I", "my", "me") naturally.
+
+        [Context]
+        {retrieved_context}
+
+        [Question from user]
+        {user_query}
+
+        [Rules]
+        - Answer **strictly based on the given context**.
+        - Write as if Raman himself is speaking.
+        - If the context doesn't have enough info, say: "I don't have enough information to answer this based on what I know."
+        - Keep the tone personal, friendly, and genuine.
+
+        [Rohan's Answer]
+        """
+
+
+def create_encoder():
+    """
+    Encoder for the app: an out-of-process EncoderPool when ENCODER_WORKERS > 0,
+    otherwise an in-process SentenceTransformer
+    """
+    num_workers = int(os.getenv("ENCODER_WORKERS", "0"))
+    if num_workers > 0:
+        return EncoderPool(
+            DEFAULT_MODEL_NAME,
+            num_workers=num_workers,
+            max_pending=int(os.getenv("ENCODER_MAX_PENDING", "32"))
+        )
+    return SentenceTransformer(DEFAULT_MODEL_NAME)
+
+
 class RAGSystem:
-    def __init__(self):
+    def __init__(self, data_path=DEFAULT_DATA_PATH, model=None,
+                 prompt_template=DEFAULT_PROMPT_TEMPLATE,
+                 system_prompt=DEFAULT_SYSTEM_PROMPT, top_k=3, shared_index=None,
+                 relevance_threshold=None, no_context_answer=NO_CONTEXT_ANSWER):
+        """
+        Args:
+            data_path: joblib file holding a DataFrame with 'text' and 'embedding' columns
+            model: Encoder to reuse (optional, loads all-MiniLM-L6-v2 when omitted)
+            prompt_template: RAG prompt with {retrieved_context} and {user_query} fields
+            system_prompt: System message sent to Groq
+            top_k: Number of chunks to put in the context
+            shared_index: SharedIndexReader to query instead of loading data_path
+                into this process
+            relevance_threshold: Skip the LLM and return no_context_answer when the
+                best similarity is below this (see calibrate_threshold.py)
+            no_context_answer: Reply used when the relevance gate fires; should match
+                the fallback line of prompt_template
+        """
         # Initialize model
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        
+        self.model = model if model is not None else SentenceTransformer(DEFAULT_MODEL_NAME)
+        self.data_path = data_path
+        self.prompt_template = prompt_template
+        self.system_prompt = system_prompt
+        self.top_k = top_k
+        self.shared_index = shared_index
+        self.relevance_threshold = relevance_threshold
+        self.no_context_answer = no_context_answer
+        self.gate_stats = {'gated': 0, 'forwarded': 0}
+        self._stats_lock = threading.Lock()
+        self.df = None
+        self.embeddings = None
+
+        # Index lives in shared memory, owned by the loader process
+        if shared_index is not None:
+            return
+
         # Load data
         try:
-            self.df = joblib.load('normalize_data.joblib')
+            self.df = joblib.load(data_path)
             print(f"DataFrame loaded. Shape: {self.df.shape}")
         except FileNotFoundError:
-            print("Error: 'normalize_data_v2.joblib' not found")
+            print(f"Error: '{data_path}' not found")
             self.df = None
-    
+
+        # Stack embeddings once instead of on every query, then drop the
+        # per-row arrays so the collection holds only one copy
+        if self.df is not None and len(self.df) > 0:
+            self.embeddings = build_index(self.df['embedding'].values)
+            self.df = self.df.drop(columns=['embedding'])
+
+    def memory_bytes(self):
+        """Approximate memory held by the loaded index"""
+        total = 0
+        if self.df is not None:
+            total += int(self.df.memory_usage(deep=True).sum())
+        if self.embeddings is not None:
+            total += self.embeddings.nbytes
+        return total
+
     def analyze_with_groq(self, text_data):
         """Send text to Groq API and get response"""
+        response, _ = self._analyze_with_groq(text_data)
+        return response
+
+    def _analyze_with_groq(self, text_data):
+        # Returns (response, error) so callers can tell a failure from an answer
         try:
             client = Groq(
                 api_key = os.environ.get("GROQ_API_KEY")
@@ -34,7 +136,7 @@ class RAGSystem:
                 messages=[
                     {
                         "role": "system",
-                        "content": "You are a helpful assistant that answers questions about Data Science based on provided context."
+                        "content": self.system_prompt
                     },
                     {
                         "role": "user",
@@ -45,64 +147,117 @@ class RAGSystem:
                 temperature=0.3,
                 max_tokens=500
             )
-            return chat_completion.choices[0].message.content
+            return chat_completion.choices[0].message.content, None
         except Exception as e:
             print(f"Error calling Groq API: {e}")
-            return "Sorry, I encountered an error while processing your request."
-    
-    def get_response(self, user_query):
-        """Main function to process query and return response"""
-        if self.df is None or len(self.df) == 0:
-            return "System not properly initialized. Please check data files."
-        
+            return ERROR_ANSWER, f"Groq API error: {str(e)}"
+
+    def retrieve(self, user_query):
+        """
+        Find the chunks most similar to a query
+
+        Returns:
+            tuple: (chunks, scores) for the top_k matches, best first,
+            or (None, None) if no index is loaded
+        """
+        if self.shared_index is not None:
+            # One snapshot per query, so a generation swap cannot mix indexes
+            try:
+                snapshot = self.shared_index.snapshot()
+            except FileNotFoundError:
+                return None, None
+            embeddings, texts = snapshot.embeddings, snapshot.texts
+            # Shared rows are pre-normalized; searching them copies nothing
+            search = search_normalized_index
+        elif self.df is None or len(self.df) == 0:
+            return None, None
+        else:
+            embeddings, texts = self.embeddings, self.df['text'].values
+            search = search_index
+
         # Get query embedding
         user_embedding = self.model.encode(user_query)
-        reshaped_user_embedding = user_embedding.reshape(1, -1)
-        normalized_user_embedding = normalize(reshaped_user_embedding, norm='max')[0]
-        
-        # Calculate similarities
-        similarities = cosine_similarity(
-            normalized_user_embedding.reshape(1, -1), 
-            np.stack(self.df['embedding'].values)
-        )
-        
+
         # Get top results
-        top_results = 3
-        top_chunks = similarities[0].argsort()[-top_results:][::-1]
-        
+        top_chunks, scores = search(embeddings, user_embedding, self.top_k)
+        chunks = [texts[idx] for idx in top_chunks[0]]
+        return chunks, scores[0]
+
+    def get_response(self, user_query, question=None):
+        """
+        Main function to process query and return response
+
+        Args:
+            user_query: Text used for retrieval and the prompt (may include chat history)
+            question: The user's question on its own, if user_query adds history.
+                The relevance gate scores this, the same way calibrate_threshold.py does.
+        """
+        response, _ = self.get_response_with_error(user_query, question=question)
+        return response
+
+    def get_response_with_error(self, user_query, question=None, save_prompt=True):
+        """
+        Like get_response, but also reports whether answering failed
+
+        Args:
+            save_prompt: Write the prompt to prompt.txt; turn off when several
+                threads answer at once
+
+        Returns:
+            tuple: (response, error). On failure response is the reply shown to
+            the user and error describes what went wrong; otherwise error is None.
+        """
+        gated = False
+        try:
+            if self.relevance_threshold is None:
+                chunks, _ = self.retrieve(user_query)
+            else:
+                # Gate before retrieving with the history, so a gated question
+                # costs a single encode and search
+                gate_query = question if question is not None else user_query
+                chunks, scores = self.retrieve(gate_query)
+                gated = chunks is not None and scores[0] < self.relevance_threshold
+                if chunks is not None and not gated and gate_query != user_query:
+                    chunks, _ = self.retrieve(user_query)
+        except (EncoderQueueFull, EncoderTimeout) as e:
+            return BUSY_ANSWER, f"Encoder busy: {str(e)}"
+
+        if chunks is None:
+            return NOT_READY_ANSWER, "Index not loaded"
+
+        # Nothing relevant retrieved: the LLM would only give the fallback line anyway
+        if gated:
+            with self._stats_lock:
+                self.gate_stats['gated'] += 1
+            return self.no_context_answer, None
+
+        with self._stats_lock:
+            self.gate_stats['forwarded'] += 1
+
         # Build retrieved context
         retrieved_context = ""
-        for idx in top_chunks:
-            retrieved_context += self.df.iloc[idx]['text'] + "\n\n"
-        
+        for chunk in chunks:
+            retrieved_context += chunk + "\n\n"
+
         # Create RAG prompt
-        rag_prompt = f"""
-        [Role]
-        You are responding as Raman — the user. Use first-person ("I", "my", "me") naturally.
-        
-        [Context]
-        {retrieved_context}
-        
-        [Question from user]
-        {user_query}
-        
-        [Rules]
-        - Answer **strictly based on the given context**.
-        - Write as if Raman himself is speaking.
-        - If the context doesn't have enough info, say: "I don't have enough information to answer this based on what I know."
-        - Keep the tone personal, friendly, and genuine.
-        
-        [Rohan's Answer]
-        """
-        
+        rag_prompt = self.prompt_template.format(
+            retrieved_context=retrieved_context,
+            user_query=user_query
+        )
+
         # Save prompt (optional)
-        with open("prompt.txt", 'w', encoding='utf-8') as f:
-            f.write(rag_prompt)
-        
+        if save_prompt:
+            with open("prompt.txt", 'w', encoding='utf-8') as f:
+                f.write(rag_prompt)
+
         # Get response from Groq
-        response = self.analyze_with_groq(rag_prompt)
-        
-        return response
+        return self._analyze_with_groq(rag_prompt)
 
 # Initialize RAG system
-rag_system = RAGSystem()
+shared_manifest = os.getenv("SHARED_INDEX_MANIFEST")
+relevance_threshold = os.getenv("RAG_RELEVANCE_THRESHOLD")
+rag_system = RAGSystem(
+    model=create_encoder(),
+    shared_index=SharedIndexReader(shared_manifest) if shared_manifest else None,
+    relevance_threshold=float(relevance_threshold) if relevance_threshold else None
+)
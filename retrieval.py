@@ -0,0 +1,89 @@
+import numpy as np
+from sklearn.preprocessing import normalize
+from sklearn.metrics.pairwise import cosine_similarity
+
+# Dimension of all-MiniLM-L6-v2 sentence embeddings
+EMBEDDING_DIM = 384
+
+
+def build_index(embeddings):
+    """
+    Stack per-chunk embeddings into the matrix searched at query time
+
+    Args:
+        embeddings: Sequence of 1-D embedding arrays (e.g. df['embedding'].values)
+
+    Returns:
+        2-D numpy array, one row per chunk
+    """
+    return np.stack(embeddings)
+
+
+def search_index(index, query_embeddings, top_k=3):
+    """
+    Exact cosine similarity search
+
+    Args:
+        index: Matrix returned by build_index
+        query_embeddings: One query vector, or a 2-D batch of them
+        top_k: Number of results per query
+
+    Returns:
+        tuple: (indices, scores), each shaped (n_queries, top_k), best match first
+    """
+    queries = np.atleast_2d(query_embeddings)
+    queries = normalize(queries, norm='max')
+
+    similarities = cosine_similarity(queries, index)
+
+    top_chunks = similarities.argsort(axis=1)[:, -top_k:][:, ::-1]
+    scores = np.take_along_axis(similarities, top_chunks, axis=1)
+    return top_chunks, scores
+
+
+def normalize_rows(embeddings, out=None, block_size=100_000):
+    """
+    L2-normalize rows block by block, so cosine similarity becomes a dot product
+
+    Args:
+        embeddings: 2-D array, one row per chunk
+        out: Optional float32 array (e.g. a writable memmap) to fill in place
+
+    Returns:
+        float32 array of unit-length rows
+    """
+    if out is None:
+        out = np.empty(embeddings.shape, dtype=np.float32)
+    for start in range(0, len(embeddings), block_size):
+        block = np.asarray(embeddings[start:start + block_size], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        # Leave all-zero rows at zero instead of dividing by zero
+        norms[norms == 0] = 1.0
+        out[start:start + block_size] = block / norms
+    return out
+
+
+def search_normalized_index(index, query_embeddings, top_k=3):
+    """
+    Exact cosine search over a matrix from normalize_rows
+
+    Only the query is normalized, so unlike search_index no copy of the
+    index is made; this is what lets a shared memmap stay shared.
+
+    Returns:
+        tuple: (indices, scores), each shaped (n_queries, top_k), best match first
+    """
+    queries = np.atleast_2d(query_embeddings).astype(np.float32)
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    queries = queries / norms
+
+    similarities = queries @ index.T
+
+    k = min(top_k, similarities.shape[1])
+    candidates = np.argpartition(similarities, -k, axis=1)[:, -k:]
+    candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+    order = np.argsort(candidate_scores, axis=1)[:, ::-1]
+    top_chunks = np.take_along_axis(candidates, order, axis=1)
+    scores = np.take_along_axis(candidate_scores, order, axis=1)
+    return top_chunks, scores
@@ -0,0 +1,296 @@
+"""
+Shared-memory corpus index for multi-process deployments
+
+A single loader process writes the embedding matrix and the chunk texts as
+.npy files on a RAM-backed filesystem (/dev/shm where available) and
+describes them in a small JSON manifest. App/API worker processes map those
+files read-only with zero copies, so every worker shares the same physical
+pages and memory no longer grows with the number of workers. Rows are
+stored L2-normalized, so queries are a plain dot product against the shared
+matrix and never make a private copy of it.
+
+Updates are generation swaps: the loader writes a complete new generation
+directory, atomically replaces the manifest, then deletes the old
+generation. Published files are never modified, and on POSIX a deleted
+file stays mapped for readers still using it, so an in-progress query never
+sees a mix of old and new data. Each manifest gets its own subdirectory,
+which a restarted loader clears, so a loader killed without cleaning up
+does not leave its index in RAM for good.
+
+Run the loader:
+    python shared_index.py --data normalize_data.joblib --manifest shared_index.json --watch 5
+
+Point the app at it:
+    SHARED_INDEX_MANIFEST=shared_index.json streamlit run main.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from retrieval import normalize_rows
+
+DEFAULT_MANIFEST_PATH = 'shared_index.json'
+
+
+def default_shared_dir():
+    # /dev/shm is RAM-backed on Linux; elsewhere the OS page cache still shares the mapping
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'rag_index')
+
+
+def _write_manifest(path, manifest):
+    # Write then rename, so readers only ever see a complete manifest
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+class SharedTexts:
+    """Read-only sequence of strings stored as offsets + one UTF-8 blob"""
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        start, stop = self._offsets[idx], self._offsets[idx + 1]
+        return self._blob[start:stop].tobytes().decode('utf-8')
+
+
+class SharedIndexSnapshot:
+    """
+    One mapped generation of the index
+
+    Hold on to the snapshot for the duration of a query. The mapping lives
+    as long as something references it, even after a newer generation is
+    published and the files are deleted.
+    """
+
+    def __init__(self, manifest):
+        self.generation = manifest['generation']
+        # Unique per publish, unlike the counter, which restarts with the loader
+        self.generation_id = manifest['generation_id']
+        directory = manifest['directory']
+
+        # mmap_mode='r' maps the pages read-only; nothing is copied
+        self.embeddings = np.load(os.path.join(directory, 'embeddings.npy'), mmap_mode='r')
+        offsets = np.load(os.path.join(directory, 'text_offsets.npy'), mmap_mode='r')
+        blob = np.load(os.path.join(directory, 'text_blob.npy'), mmap_mode='r')
+        self.texts = SharedTexts(offsets, blob)
+
+    def __len__(self):
+        return len(self.texts)
+
+
+class SharedIndexReader:
+    """
+    Worker-side handle; maps whatever generation the manifest names
+
+    Example:
+        reader = SharedIndexReader("shared_index.json")
+        snap = reader.snapshot()
+        scores = snap.embeddings @ query
+        best_text = snap.texts[int(scores.argmax())]
+    """
+
+    def __init__(self, manifest_path=DEFAULT_MANIFEST_PATH):
+        self.manifest_path = manifest_path
+        self._current = None
+        self._manifest_key = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """Return the latest published generation"""
+        with self._lock:
+            self._refresh()
+            return self._current
+
+    def _refresh(self, attempts=3):
+        for attempt in range(attempts):
+            # A cheap stat per query; the manifest is only re-read when replaced
+            stat = os.stat(self.manifest_path)
+            key = (stat.st_ino, stat.st_mtime_ns)
+            if key == self._manifest_key and self._current is not None:
+                return
+
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+
+            if self._current is not None and manifest['generation_id'] == self._current.generation_id:
+                self._manifest_key = key
+                return
+
+            try:
+                snapshot = SharedIndexSnapshot(manifest)
+            except FileNotFoundError:
+                # Loader swapped generations between our read and open; re-read
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.05)
+                continue
+
+            # Queries still holding the previous snapshot keep their mapping
+            self._current = snapshot
+            self._manifest_key = key
+            print(f"Attached shared index generation {snapshot.generation} ({len(snapshot)} chunks)")
+            return
+
+
+class SharedIndexPublisher:
+    """
+    Loader-side owner of the shared files
+
+    Only this process writes and deletes generations. Call close() on exit
+    so nothing is left behind in shared memory; if the loader is killed
+    instead, the next publisher for the same manifest removes its files.
+    """
+
+    def __init__(self, manifest_path=DEFAULT_MANIFEST_PATH, shared_dir=None):
+        self.manifest_path = manifest_path
+        # One subdirectory per manifest, so loaders for different collections
+        # never delete each other's generations
+        key = hashlib.sha1(os.path.abspath(manifest_path).encode('utf-8')).hexdigest()[:16]
+        self.shared_dir = os.path.join(shared_dir or default_shared_dir(), key)
+        self.generation = 0
+        self._directory = None
+        self._remove_stale()
+
+    def publish(self, embeddings, texts):
+        """
+        Publish a new generation and retire the previous one
+
+        Args:
+            embeddings: 2-D array, one row per chunk
+            texts: Sequence of chunk strings, same length as embeddings
+
+        Returns:
+            int: The new generation number
+        """
+        embeddings = np.asarray(embeddings)
+        encoded = [t.encode('utf-8') for t in texts]
+        if len(encoded) != len(embeddings):
+            raise ValueError(f"{len(embeddings)} embeddings but {len(encoded)} texts")
+
+        self.generation += 1
+        generation_id = uuid.uuid4().hex
+        directory = os.path.join(self.shared_dir, generation_id)
+        os.makedirs(directory)
+
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        # Normalize straight into the shared file, block by block
+        shared_embeddings = np.lib.format.open_memmap(
+            os.path.join(directory, 'embeddings.npy'), mode='w+',
+            dtype=np.float32, shape=embeddings.shape
+        )
+        normalize_rows(embeddings, out=shared_embeddings)
+        shared_embeddings.flush()
+        del shared_embeddings
+
+        np.save(os.path.join(directory, 'text_offsets.npy'), offsets)
+        np.save(os.path.join(directory, 'text_blob.npy'), blob)
+
+        _write_manifest(self.manifest_path, {
+            'generation': self.generation,
+            'generation_id': generation_id,
+            'created': time.time(),
+            'directory': directory,
+            'shape': list(embeddings.shape),
+            'dtype': np.dtype(np.float32).str,
+            'normalized': True,
+        })
+
+        # Readers now see the new generation; ones mid-query keep the old mapping
+        previous = self._directory
+        self._directory = directory
+        if previous is not None:
+            self._remove(previous)
+        return self.generation
+
+    def publish_dataframe(self, df):
+        from retrieval import build_index
+        return self.publish(build_index(df['embedding'].values), df['text'].tolist())
+
+    def publish_file(self, data_path):
+        import joblib
+        df = joblib.load(data_path)
+        generation = self.publish_dataframe(df)
+        print(f"Published generation {generation} from '{data_path}'. Shape: {df.shape}")
+        return generation
+
+    def _remove_stale(self):
+        # Generations left by a previous loader for this manifest that never reached close()
+        if not os.path.isdir(self.shared_dir):
+            return
+        for entry in os.listdir(self.shared_dir):
+            print(f"Removing stale generation '{entry}'")
+            self._remove(os.path.join(self.shared_dir, entry))
+
+    def _remove(self, directory):
+        # On Windows mapped files cannot be deleted; they are cleaned up on the next close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def close(self):
+        try:
+            os.remove(self.manifest_path)
+        except FileNotFoundError:
+            pass
+        if self._directory is not None:
+            self._remove(self._directory)
+            self._directory = None
+        try:
+            os.rmdir(self.shared_dir)
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG index from shared memory")
+    parser.add_argument('--data', default='normalize_data.joblib')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH)
+    parser.add_argument('--shared-dir', default=None,
+                        help="Base directory for generations (default: /dev/shm/rag_index)")
+    parser.add_argument('--watch', type=float, default=0,
+                        help="Seconds between checks for a changed data file (0 = publish once and wait)")
+    args = parser.parse_args()
+
+    publisher = SharedIndexPublisher(args.manifest, args.shared_dir)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    try:
+        last_mtime = os.stat(args.data).st_mtime_ns
+        publisher.publish_file(args.data)
+        print(f"Manifest: {args.manifest}. Press Ctrl+C to stop.")
+
+        # Without --watch, wake up once a second just to notice the stop signal
+        while not stop.wait(args.watch or 1.0):
+            if not args.watch:
+                continue
+            mtime = os.stat(args.data).st_mtime_ns
+            if mtime != last_mtime:
+                last_mtime = mtime
+                publisher.publish_file(args.data)
+    finally:
+        publisher.close()
+        print("Shared index removed")
+
+
+if __name__ == "__main__":
+    main()
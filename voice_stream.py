@@ -0,0 +1,176 @@
+import io
+import queue
+import wave
+from collections import deque
+
+import numpy as np
+
+# Rate sent to Whisper; 16 kHz mono is what it works on internally
+STREAM_SAMPLE_RATE = 16000
+
+
+def pcm_to_wav(pcm, sample_rate=STREAM_SAMPLE_RATE):
+    """Wrap 16-bit mono PCM bytes in a WAV container"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class Endpointer:
+    """
+    Energy-based voice activity detection with end-of-utterance detection
+
+    Feed fixed-size frames of 16-bit mono PCM to process(). It returns a
+    list of (event, payload) tuples:
+        ('speech_start', None)   user started talking (use for barge-in)
+        ('utterance', pcm)       user stopped talking; pcm is the whole utterance
+        ('speech_end', None)     speech stopped but was too short to transcribe
+
+    The speech threshold tracks the background noise level, so it adapts
+    to the room and microphone gain.
+    """
+
+    def __init__(self, sample_rate=STREAM_SAMPLE_RATE, frame_ms=20, start_ms=60,
+                 end_silence_ms=300, pre_roll_ms=200, min_utterance_ms=250,
+                 max_utterance_ms=15000, threshold_ratio=3.0, min_rms=300):
+        self.sample_rate = sample_rate
+        self.frame_length = sample_rate * frame_ms // 1000
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        self.min_frames = max(1, min_utterance_ms // frame_ms)
+        self.max_frames = max(1, max_utterance_ms // frame_ms)
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+
+        self.noise_floor = float(min_rms)
+        self.speaking = False
+        # Audio just before speech is detected, so the first syllable is not clipped
+        self._pre_roll = deque(maxlen=max(self.start_frames, pre_roll_ms // frame_ms))
+        self._frames = []
+        self._voiced_run = 0
+        self._voiced_count = 0
+        self._silence_run = 0
+
+    @property
+    def threshold(self):
+        return max(self.noise_floor * self.threshold_ratio, self.min_rms)
+
+    def process(self, frame):
+        """
+        Args:
+            frame: numpy int16 array of frame_length samples
+
+        Returns:
+            list of (event, payload) tuples, usually empty
+        """
+        samples = frame.astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        voiced = rms > self.threshold
+        pcm = frame.astype(np.int16).tobytes()
+
+        if not self.speaking:
+            self._pre_roll.append(pcm)
+            if voiced:
+                self._voiced_run += 1
+            else:
+                self._voiced_run = 0
+                # Only learn the noise floor from non-speech
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+
+            if self._voiced_run >= self.start_frames:
+                self.speaking = True
+                self._frames = list(self._pre_roll)
+                self._voiced_count = self._voiced_run
+                self._silence_run = 0
+                return [('speech_start', None)]
+            return []
+
+        self._frames.append(pcm)
+        if voiced:
+            self._voiced_count += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+
+        if self._silence_run >= self.end_frames or len(self._frames) >= self.max_frames:
+            return [self._finish()]
+        return []
+
+    def _finish(self):
+        voiced_frames = self._voiced_count
+        utterance = b''.join(self._frames)
+
+        self.speaking = False
+        self._frames = []
+        self._pre_roll.clear()
+        self._voiced_run = 0
+        self._voiced_count = 0
+        self._silence_run = 0
+
+        if voiced_frames < self.min_frames:
+            return ('speech_end', None)
+        return ('utterance', utterance)
+
+
+class HandsFreeListener:
+    """
+    Turns a live stream of browser audio frames into utterances
+
+    on_frame() is meant as the audio_frame_callback of streamlit-webrtc and
+    runs on its media thread. Endpointer events are put on self.events as
+    (event, payload) tuples, with each utterance already wrapped as WAV bytes
+    ready for transcribe_audio_with_groq.
+    """
+
+    def __init__(self, endpointer=None):
+        self.endpointer = endpointer or Endpointer()
+        self.events = queue.Queue()
+        self._resampler = None
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    def on_frame(self, frame):
+        """Accepts an av.AudioFrame of any rate/layout and returns it unchanged"""
+        if self._resampler is None:
+            import av
+            self._resampler = av.AudioResampler(
+                format='s16', layout='mono', rate=self.endpointer.sample_rate
+            )
+
+        resampled = self._resampler.resample(frame)
+        # PyAV < 9 returns a single frame rather than a list
+        if not isinstance(resampled, list):
+            resampled = [resampled] if resampled is not None else []
+        for out in resampled:
+            self.feed(out.to_ndarray().reshape(-1))
+        return frame
+
+    def clear_events(self):
+        """
+        Drop events queued so far, e.g. speech heard while an answer was being prepared
+
+        If the user is still talking, a fresh speech_start is queued in place
+        of the dropped one, so their utterance still barges in.
+        """
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                break
+        if self.endpointer.speaking:
+            self.events.put(('speech_start', None))
+
+    def feed(self, samples):
+        """Feed 16-bit mono samples at the endpointer's sample rate"""
+        self._pending = np.concatenate([self._pending, samples.astype(np.int16)])
+        frame_length = self.endpointer.frame_length
+
+        while len(self._pending) >= frame_length:
+            frame, self._pending = self._pending[:frame_length], self._pending[frame_length:]
+            for event, payload in self.endpointer.process(frame):
+                if event == 'utterance':
+                    payload = pcm_to_wav(payload, self.endpointer.sample_rate)
+                self.events.put((event, payload))